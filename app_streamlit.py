@@ -1,30 +1,113 @@
 # app_streamlit.py (UPDATED)
 import os
-import time
-import json
 import re
-from typing import List, Set, Dict
-from datetime import datetime, date
+import asyncio
+import hashlib
+import functools
+import itertools
+import io
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import List, Set, Dict, Optional, Tuple
+from html import unescape as html_unescape
 
 import streamlit as st
 import pandas as pd
 import requests
+import aiohttp
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scraper import RateLimiter
 
 # Try to import your existing modules (preferred)
 try:
-    from scrapper import fetch_html
+    from parse_linkedin_post import parse_linkedin_html
 except Exception:
-    fetch_html = None
+    parse_linkedin_html = None
 
 try:
-    from parse_linkedin_post import parse_linkedin_html
+    import redis
 except Exception:
-    parse_linkedin_html = None
+    redis = None
+
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
+try:
+    from pybloom_live import ScalableBloomFilter
+except Exception:
+    ScalableBloomFilter = None
+
+# -------------------- HTTP sessions (keep-alive + pooling) --------------------
+@st.cache_resource
+def _make_session(host: str, pool_size: int = 16) -> requests.Session:
+    # cache_resource keeps the session (and its open sockets) alive across Streamlit reruns
+    sess = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    sess.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry))
+    sess.headers.update({"Connection": "keep-alive"})
+    return sess
+
+# SerpAPI calls stay on requests; keep-alive reuses the TLS connection across calls
+_SERP_SESSION = _make_session("serpapi.com")
+
+# -------------------- Rate limiting --------------------
+SERPAPI_MAX_QPS = 5
+SERPAPI_WORKERS = 8
+
+# same limiter as run_pipeline.py, so both tools pace SerpAPI/ScrapingBee the same way
+_SERP_LIMITER = RateLimiter(SERPAPI_MAX_QPS)
+
+# -------------------- Response cache (Redis, optional) --------------------
+FETCH_CACHE_TTL = 6 * 3600   # LinkedIn post HTML is effectively static within hours
+SERP_CACHE_TTL = 6 * 3600
+PARSE_CACHE_TTL = 24 * 3600  # parsed dicts are a pure function of the HTML bytes
+
+@st.cache_resource
+def _get_cache():
+    """Connect to Redis (REDIS_HOST/REDIS_PORT). Returns None when redis is unavailable, which disables caching."""
+    if redis is None:
+        return None
+    try:
+        client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=int(os.getenv("REDIS_PORT", "6379")),
+                             decode_responses=False, socket_connect_timeout=1)
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+_CACHE = _get_cache()
+
+def cache_key(prefix: bytes, *parts) -> bytes:
+    return prefix + hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).digest()
+
+def cache_get(key: bytes) -> Optional[bytes]:
+    if _CACHE is None:
+        return None
+    try:
+        cached = _CACHE.get(key)
+    except Exception:
+        return None
+    return cached if cached else None
+
+def cache_set(key: bytes, value: bytes, ttl: int):
+    if _CACHE is None:
+        return
+    try:
+        _CACHE.setex(key, ttl, value)
+    except Exception:
+        pass
 
 # -------------------- Utility: company matching --------------------
 # ---------- Auto-detect company slug helper using SerpAPI ----------
 import urllib.parse
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def extract_linkedin_company_slugs_from_url(url: str):
     """
     Given a linkedin company URL (or any linkedin url), return potential slugs.
@@ -46,23 +129,28 @@ def extract_linkedin_company_slugs_from_url(url: str):
         pass
     return []
 
-def serpapi_find_company_slugs(company_name: str, serpapi_key: str = None, top: int = 6) -> List[str]:
+@st.cache_data(ttl=3600, show_spinner=False)
+def serpapi_find_company_slugs(company_name: str, _serpapi_key: str = None, top: int = 6, use_cache: bool = True) -> List[str]:
     """
     Use SerpAPI to search for candidate LinkedIn company URLs for a given company name.
     Returns list of possible slugs (de-duplicated).
+    Memoized by st.cache_data; the leading underscore keeps the API key out of the cache key.
+    A missing key or failed request raises, so that an empty result is never memoized.
     """
-    key = serpapi_key or os.getenv("SERPAPI_KEY")
+    key = _serpapi_key or os.getenv("SERPAPI_KEY")
     if not key:
-        return []
+        raise RuntimeError("SerpAPI key not provided. Set SERPAPI_KEY env var or provide key in app.")
+    ckey = cache_key(b"serp_slugs:", company_name, top)
+    cached = cache_get(ckey) if use_cache else None
+    if cached:
+        return orjson.loads(cached)
     q = f'site:linkedin.com/company "{company_name}"'
     endpoint = "https://serpapi.com/search.json"
     params = {"engine": "google", "q": q, "num": top, "api_key": key}
-    try:
-        r = requests.get(endpoint, params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return []
+    _SERP_LIMITER.acquire()
+    r = _SERP_SESSION.get(endpoint, params=params, timeout=20)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
     slugs = []
     for item in data.get("organic_results", []):
         link = item.get("link") or item.get("formattedUrl") or ""
@@ -71,26 +159,81 @@ def serpapi_find_company_slugs(company_name: str, serpapi_key: str = None, top:
             for s in found:
                 if s and s not in slugs:
                     slugs.append(s)
+    cache_set(ckey, orjson.dumps(slugs), SERP_CACHE_TTL)
     return slugs
 
-def normalize(s):
+_WS_RE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=8192)
+def _normalize_text_str(s: str) -> str:
+    return _WS_RE.sub(" ", s).strip().lower()
+
+@functools.lru_cache(maxsize=8192)
+def _normalize_url_str(s: str) -> str:
+    return s.strip().lower()
+
+def _normalize_text(s):
+    """Free text (names, content): collapse whitespace and lowercase. Memoized, since author strings repeat."""
+    if not s:
+        return ""
+    return _normalize_text_str(str(s))
+
+def _normalize_url(s):
+    """URLs and slugs contain no inner whitespace, so skip the regex and just strip + lowercase."""
     if not s:
         return ""
-    return re.sub(r"\s+", " ", str(s)).strip().lower()
+    return _normalize_url_str(str(s))
+
+class CompanyMatcher:
+    """
+    Normalized company names/slugs compiled once per run. With pyahocorasick installed each
+    field is checked in a single Aho-Corasick pass instead of one substring scan per name/slug;
+    otherwise it falls back to plain `in` checks.
+    """
+    def __init__(self, company_names: List[str], company_slugs: List[str] = None):
+        self.names = tuple(dict.fromkeys(n for n in (_normalize_text(x) for x in company_names if x) if n))
+        self.slugs = tuple(dict.fromkeys(s for s in (_normalize_url(x) for x in (company_slugs or []) if x) if s))
+        self._automaton = None
+        if ahocorasick is not None and (self.names or self.slugs):
+            kinds: Dict[str, Set[str]] = {}
+            for n in self.names:
+                kinds.setdefault(n, set()).add("name")
+            for sl in self.slugs:
+                kinds.setdefault(sl, set()).add("slug")
+            A = ahocorasick.Automaton()
+            for word, tags in kinds.items():
+                A.add_word(word, frozenset(tags))
+            A.make_automaton()
+            self._automaton = A
+
+    def _any(self, text: str, kind: str, patterns) -> bool:
+        if not text or not patterns:
+            return False
+        if self._automaton is None:
+            return any(p in text for p in patterns)
+        return any(kind in tags for _, tags in self._automaton.iter(text))
+
+    def has_name(self, text: str) -> bool:
+        return self._any(text, "name", self.names)
+
+    def has_slug(self, text: str) -> bool:
+        return self._any(text, "slug", self.slugs)
+
+    def starts_with_name(self, text: str) -> bool:
+        return any(text.startswith(n) for n in self.names)
 
-def company_matches_parsed(parsed: Dict, company_names: List[str], company_slugs: List[str]=None) -> bool:
+def company_matches_parsed(parsed: Dict, company_names: List[str], company_slugs: List[str]=None,
+                           matcher: CompanyMatcher = None) -> bool:
     """
     Return True if the parsed post looks like it was posted by one of the company_names/slugs.
+    Pass a prebuilt `matcher` to avoid recompiling the names/slugs for every post.
     """
-    company_slugs = company_slugs or []
-    names_norm = [normalize(x) for x in company_names if x]
-    slugs_norm = [normalize(x) for x in company_slugs if x]
+    matcher = matcher or CompanyMatcher(company_names, company_slugs)
 
     # 1) parsed author name
-    author = normalize(parsed.get("author") or parsed.get("creator") or "")
-    for n in names_norm:
-        if n and n in author:
-            return True
+    author = _normalize_text(parsed.get("author") or parsed.get("creator") or "")
+    if matcher.has_name(author):
+        return True
 
     # 2) raw_jsonld author/url fields
     raw = parsed.get("raw_jsonld") or []
@@ -98,82 +241,143 @@ def company_matches_parsed(parsed: Dict, company_names: List[str], company_slugs
         try:
             auth = obj.get("author") or obj.get("creator") or obj.get("publisher")
             if isinstance(auth, dict):
-                aname = normalize(auth.get("name"))
-                aurl = normalize(auth.get("url") or auth.get("sameAs") or "")
-                for n in names_norm:
-                    if n and n in aname:
-                        return True
-                for s in slugs_norm:
-                    if s and s in aurl:
-                        return True
+                if matcher.has_name(_normalize_text(auth.get("name"))):
+                    return True
+                if matcher.has_slug(_normalize_url(auth.get("url") or auth.get("sameAs") or "")):
+                    return True
             elif isinstance(auth, str):
-                for n in names_norm:
-                    if n and n in normalize(auth):
-                        return True
+                if matcher.has_name(_normalize_text(auth)):
+                    return True
         except Exception:
             pass
 
     # 3) parsed url for company slug
-    post_url = normalize(parsed.get("url") or parsed.get("fetched_url") or "")
-    for s in slugs_norm:
-        if s and s in post_url:
-            return True
+    post_url = _normalize_url(parsed.get("url") or parsed.get("fetched_url") or "")
+    if matcher.has_slug(post_url):
+        return True
 
     # 4) check content/description for the company name (fallback)
-    content = normalize(parsed.get("content") or parsed.get("description") or "")
-    for n in names_norm:
-        if n and content.startswith(n):
-            return True
+    content = _normalize_text(parsed.get("content") or parsed.get("description") or "")
+    return matcher.starts_with_name(content)
 
-    return False
+def url_may_match_company(url: str, matcher: CompanyMatcher) -> bool:
+    """
+    Cheap pre-fetch check on the URL alone: company posts live under the company slug
+    (or a hyphenated form of its name); personal /in/ profile URLs never qualify.
+    /feed/update/urn:li:activity:... URLs carry no author slug, so they are left to the
+    parse-and-match step.
+    """
+    u = url.lower()
+    if "linkedin.com/in/" in u:
+        return False
+    if "/feed/update/" in u:
+        return True
+    if matcher.has_slug(u):
+        return True
+    return any(n.replace(" ", "-") in u for n in matcher.names)
 
 # -------------------- SerpAPI & fetch helpers --------------------
-def serpapi_search(query: str, top: int = 10, serpapi_key: str = None) -> List[str]:
-    key = serpapi_key or os.getenv("SERPAPI_KEY")
+@st.cache_data(ttl=3600, show_spinner=False)
+def serpapi_search(query: str, top: int = 10, _serpapi_key: str = None, use_cache: bool = True) -> List[str]:
+    # st.cache_data memoizes by (query, top, use_cache); `_serpapi_key` is excluded from the hash
+    key = _serpapi_key or os.getenv("SERPAPI_KEY")
     if not key:
         raise RuntimeError("SerpAPI key not provided. Set SERPAPI_KEY env var or provide key in app.")
+    # SerpAPI bills per search, so identical (query, top) pairs are served from cache
+    ckey = cache_key(b"serp:", query, top)
+    cached = cache_get(ckey) if use_cache else None
+    if cached:
+        return orjson.loads(cached)
     endpoint = "https://serpapi.com/search.json"
     params = {"engine": "google", "q": query, "num": top, "api_key": key}
-    r = requests.get(endpoint, params=params, timeout=30)
+    _SERP_LIMITER.acquire()
+    r = _SERP_SESSION.get(endpoint, params=params, timeout=30)
     r.raise_for_status()
-    data = r.json()
+    data = orjson.loads(r.content)
     urls = []
     for item in data.get("organic_results", []):
         url = item.get("link")
         if url and "linkedin.com" in url:
             urls.append(url)
+    cache_set(ckey, orjson.dumps(urls), SERP_CACHE_TTL)
     return urls
 
-def local_fetch_html(url: str, scrapingbee_key: str = None, render_js=True, save_path=None, timeout=60) -> str:
-    if fetch_html:
-        return fetch_html(url, render_js=render_js, save_path=save_path, timeout=timeout)
-    key = scrapingbee_key or os.getenv("SCRAPINGBEE_KEY")
-    if not key:
-        raise RuntimeError("No ScrapingBee key found. Set SCRAPINGBEE_KEY env var or provide key in app.")
-    endpoint = "https://app.scrapingbee.com/api/v1/"
-    params = {"api_key": key, "url": url, "render_js": "true" if render_js else "false"}
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-    r = requests.get(endpoint, params=params, headers=headers, timeout=timeout)
-    r.raise_for_status()
-    html = r.text
-    if save_path:
-        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write(html)
-    return html
+# -------------------- Async fetch helpers --------------------
+SCRAPINGBEE_ENDPOINT = "https://app.scrapingbee.com/api/v1/"
+FETCH_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+
+async def fetch_one(session: aiohttp.ClientSession, sem: asyncio.Semaphore, limiter: RateLimiter,
+                    url: str, scrapingbee_key: str, render_js=True, timeout=60,
+                    use_cache: bool = True) -> Tuple[str, Optional[str], Optional[Exception]]:
+    """
+    Fetch one page through ScrapingBee. Returns (url, html, error) instead of raising,
+    so one failed URL does not cancel the rest of the batch.
+    """
+    ckey = cache_key(b"sb:", url, render_js)
+    cached = cache_get(ckey) if use_cache else None
+    if cached:
+        return url, cached.decode("utf-8"), None
+    params = {"api_key": scrapingbee_key, "url": url, "render_js": "true" if render_js else "false"}
+    try:
+        await limiter.acquire_async()
+        async with sem:
+            async with session.get(SCRAPINGBEE_ENDPOINT, params=params,
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+                r.raise_for_status()
+                html = await r.text()
+        cache_set(ckey, html.encode("utf-8"), FETCH_CACHE_TTL)
+        return url, html, None
+    except Exception as e:
+        return url, None, e
+
+async def gather_all(urls_list: List[str], concurrency: int, scrapingbee_key: str, render_js=True,
+                     rate: Optional[float] = None, on_done=None, use_cache: bool = True) -> List[Tuple[str, Optional[str], Optional[Exception]]]:
+    """
+    Fetch all URLs with up to `concurrency` requests in flight over one shared session.
+    `on_done(done, total)` is called as each fetch completes (used for the progress bar).
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(rate)
+    results = []
+    async with aiohttp.ClientSession(headers=FETCH_HEADERS) as session:
+        tasks = [fetch_one(session, sem, limiter, u, scrapingbee_key, render_js=render_js, use_cache=use_cache)
+                 for u in urls_list]
+        for coro in asyncio.as_completed(tasks):
+            results.append(await coro)
+            if on_done:
+                on_done(len(results), len(tasks))
+    return results
+
+# the fallback parser only needs the JSON-LD blocks and <link rel=canonical>, which two byte-level
+# regex scans find without building a DOM
+_JSONLD_RE = re.compile(rb'<script\b[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE)
+_CANON_RES = (
+    re.compile(rb'<link\b[^>]*rel=["\']canonical["\'][^>]*href=["\']([^"\']+)["\']', re.IGNORECASE),
+    re.compile(rb'<link\b[^>]*href=["\']([^"\']+)["\'][^>]*rel=["\']canonical["\']', re.IGNORECASE),
+)
 
 def local_parse_html(html: str, source_filename: str = None) -> Dict:
     if parse_linkedin_html:
         return parse_linkedin_html(html, source_filename=source_filename)
     # minimal fallback
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
+    html_bytes = html.encode("utf-8") if isinstance(html, str) else html
+    blocks = [m.group(1) for m in _JSONLD_RE.finditer(html_bytes)]
+    canonical = next((m.group(1) for m in (r.search(html_bytes) for r in _CANON_RES) if m), None)
+    soup = None
+    if not blocks:
+        # nothing found by the fast scan: fall back to a full DOM parse
+        from bs4 import BeautifulSoup, FeatureNotFound
+        try:
+            soup = BeautifulSoup(html, "lxml")  # C parser; much faster than html.parser
+        except FeatureNotFound:
+            soup = BeautifulSoup(html, "html.parser")
+        blocks = [str(script.string or "") for script in soup.find_all("script", type="application/ld+json")]
     out = {"url": None, "title": None, "content": None, "likes": None,
            "comments": None, "reposts": None, "author": None, "date_published": None,
            "images": [], "raw_jsonld": []}
-    for script in soup.find_all("script", type="application/ld+json"):
+    for block in blocks:
         try:
-            data = json.loads(script.string)
+            data = orjson.loads(block)
             out["raw_jsonld"].append(data)
             if isinstance(data, dict):
                 if data.get("articleBody"):
@@ -195,11 +399,160 @@ def local_parse_html(html: str, source_filename: str = None) -> Dict:
                             out["reposts"] = int(cnt or 0)
         except Exception:
             continue
-    can = soup.find("link", rel="canonical")
-    if can and can.get("href"):
-        out["url"] = can["href"]
+    if canonical:
+        out["url"] = html_unescape(canonical.decode("utf-8", "replace"))
+    elif soup is not None:
+        can = soup.find("link", rel="canonical")
+        if can and can.get("href"):
+            out["url"] = can["href"]
+    return out
+
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_POOL_MIN = 4  # below this many pages a process pool costs more to start than it saves
+
+def _parse_cache_key(html: str) -> bytes:
+    return b"parse:" + hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
+
+def parse_many(htmls: List[str], use_cache: bool = True) -> List:
+    """
+    Parse a batch of pages, returning one parsed dict (or the raised Exception) per page, in order.
+    Parse-cache hits are served directly; misses run parse_linkedin_html on a process pool,
+    since the parse is CPU-bound Python that would otherwise serialize on the GIL.
+    """
+    keys = [_parse_cache_key(h) for h in htmls]
+    out: List = [None] * len(htmls)
+    misses = []
+    for i, key in enumerate(keys):
+        cached = cache_get(key) if use_cache else None
+        if cached:
+            out[i] = pickle.loads(cached)
+        else:
+            misses.append(i)
+
+    if parse_linkedin_html is not None and len(misses) >= PARSE_POOL_MIN:
+        # parse_linkedin_html lives in an importable module, so it pickles cleanly to the workers
+        with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, len(misses))) as ex:
+            futures = [ex.submit(parse_linkedin_html, htmls[i]) for i in misses]
+            results = []
+            for fut in futures:
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    results.append(e)
+    else:
+        results = []
+        for i in misses:
+            try:
+                results.append(local_parse_html(htmls[i]))
+            except Exception as e:
+                results.append(e)
+
+    for i, res in zip(misses, results):
+        out[i] = res
+        if not isinstance(res, Exception):
+            cache_set(keys[i], pickle.dumps(res), PARSE_CACHE_TTL)
     return out
 
+# -------------------- Seen-URL filter (persisted across runs) --------------------
+SEEN_URLS_PATH = "seen_urls.pkl"
+
+def load_seen_urls(path: str = SEEN_URLS_PATH):
+    """
+    Load the set of URLs fetched in earlier runs: a ScalableBloomFilter (bounded memory, O(1)
+    membership, rare false positives) when pybloom_live is installed, otherwise a plain set.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+    if ScalableBloomFilter is not None:
+        return ScalableBloomFilter(initial_capacity=10_000, error_rate=0.001)
+    return set()
+
+def save_seen_urls(seen, path: str = SEEN_URLS_PATH):
+    with open(path, "wb") as f:
+        pickle.dump(seen, f)
+
+# -------------------- Master store (SQLite) --------------------
+# The app keeps its own master, separate from the parquet master shared by run_pipeline.py and
+# linkedin_batch_parse_and_save.py: its rows have a different shape (reposts, fetched_url, no
+# raw_jsonld_present/source_file), and every "Run pipeline" click upserts a handful of rows, which
+# SQLite does in place where parquet would rewrite the whole file. Both start from the legacy xlsx.
+MASTER_COLUMNS = ["url", "title", "author", "content", "likes", "comments", "reposts",
+                  "date_published", "images", "fetched_url"]
+LEGACY_MASTER_XLSX = "linkedin_posts_master.xlsx"  # pre-SQLite master, imported once into an empty db
+
+def _write_rows(con: sqlite3.Connection, df: pd.DataFrame, verb: str = "INSERT OR REPLACE") -> None:
+    # one executemany in one transaction: no shared staging table for concurrent sessions to clobber
+    rows = df[MASTER_COLUMNS].astype(object).where(df[MASTER_COLUMNS].notna(), None).itertuples(index=False, name=None)
+    placeholders = ", ".join("?" * len(MASTER_COLUMNS))
+    with con:
+        con.executemany(f"{verb} INTO posts ({', '.join(MASTER_COLUMNS)}) VALUES ({placeholders})", rows)
+
+def _import_legacy_master(con: sqlite3.Connection) -> None:
+    if not os.path.exists(LEGACY_MASTER_XLSX):
+        return
+    if con.execute("SELECT 1 FROM posts LIMIT 1").fetchone() is not None:
+        return
+    try:
+        old = pd.read_excel(LEGACY_MASTER_XLSX, engine="openpyxl")
+    except Exception as e:
+        st.warning(f"Could not import legacy master {LEGACY_MASTER_XLSX}: {e}")
+        return
+    if "url" not in old.columns:
+        return
+    old = old.reindex(columns=MASTER_COLUMNS).dropna(subset=["url"]).drop_duplicates("url", keep="last")
+    for c in ("likes", "comments", "reposts"):
+        old[c] = pd.to_numeric(old[c], errors="coerce").astype("Int64")
+    # OR IGNORE: if another session wrote a url meanwhile, its row is newer than the legacy one
+    _write_rows(con, old, "INSERT OR IGNORE")
+
+def _connect_master(db_path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(db_path)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS posts (url TEXT PRIMARY KEY, title TEXT, author TEXT, content TEXT, "
+        "likes INTEGER, comments INTEGER, reposts INTEGER, date_published TEXT, images TEXT, fetched_url TEXT)"
+    )
+    _import_legacy_master(con)
+    return con
+
+def upsert_master_db(db_path: str, parsed_results: List[Dict]) -> int:
+    """
+    Upsert parsed posts into the master table keyed on url. Only the new rows are written
+    (INSERT OR REPLACE in one transaction), so cost no longer grows with the size of the master.
+    """
+    new_df = pd.DataFrame(parsed_results).reindex(columns=MASTER_COLUMNS)
+    new_df["images"] = new_df["images"].map(
+        lambda v: orjson.dumps(v).decode("utf-8") if isinstance(v, (list, dict)) else orjson.dumps([]).decode("utf-8"))
+    con = _connect_master(db_path)
+    try:
+        _write_rows(con, new_df)
+    finally:
+        con.close()
+    return len(new_df)
+
+def load_master_db(db_path: str) -> pd.DataFrame:
+    if not os.path.exists(db_path) and not os.path.exists(LEGACY_MASTER_XLSX):
+        return pd.DataFrame(columns=MASTER_COLUMNS)
+    con = _connect_master(db_path)
+    try:
+        return pd.read_sql_query("SELECT * FROM posts", con)
+    finally:
+        con.close()
+
+def to_excel_bytes(df: pd.DataFrame) -> io.BytesIO:
+    """Serialize df to an in-memory xlsx; prefers xlsxwriter, which writes much faster than openpyxl."""
+    buf = io.BytesIO()
+    try:
+        df.to_excel(buf, index=False, engine="xlsxwriter")
+    except ImportError:
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False, engine="openpyxl")
+    buf.seek(0)
+    return buf
+
 # -------------------- Streamlit UI --------------------
 st.set_page_config(layout="wide", page_title="LinkedIn Scraper for Marketing Teams")
 st.title("LinkedIn Scraper — Search, Parse, Filter (SerpAPI + ScrapingBee)")
@@ -212,11 +565,22 @@ with st.sidebar:
     st.header("Pipeline options")
     top_n = st.number_input("Top N results per query", min_value=1, max_value=50, value=8, step=1)
     render_js = st.checkbox("Render JS when fetching pages (recommended)", value=True)
-    delay_between_fetch = st.number_input("Delay between fetches (seconds)", min_value=0.0, max_value=5.0, value=0.8, step=0.1)
+    concurrency = st.number_input("Concurrent fetches", min_value=1, max_value=32, value=8, step=1)
+    max_fetch_rate = st.number_input("Max fetches per second (0 = unlimited)", min_value=0.0, max_value=20.0, value=2.0, step=0.5)
+    skip_cache = st.checkbox("Bypass cache", value=False, help="Ignore cached SerpAPI results and page HTML (needs Redis)")
+    skip_seen = st.checkbox("Skip URLs fetched in previous runs", value=False)
     st.markdown("---")
     st.header("Output")
-    master_excel_name = st.text_input("Master Excel filename", value="linkedin_posts_master.xlsx")
+    master_db_name = st.text_input("Master database filename (SQLite)", value="linkedin_posts_master.db")
     combined_json_name = st.text_input("Combined JSON filename", value="all_posts_combined.json")
+    # the Excel copy of the master is only materialized on demand
+    if st.button("Export master database to Excel"):
+        try:
+            master_xlsx = to_excel_bytes(load_master_db(master_db_name))
+            st.download_button("Download master Excel", data=master_xlsx, file_name="linkedin_posts_master.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        except Exception as e:
+            st.warning("Master Excel export not available: " + str(e))
 
 mode = st.selectbox("Select mode", ["Event search", "Company search", "Specific post URLs"])
 
@@ -251,64 +615,56 @@ def build_queries_from_inputs(company_slugs_for_queries: List[str] = None):
     If company_slugs_for_queries is provided, we will include site:linkedin.com/company/<slug> queries
     to bias results toward official company posts.
     """
-    queries = []
+    slugs = company_slugs_for_queries or []
+    # insertion-ordered set: O(1) dedupe while building instead of a dict.fromkeys pass at the end
+    queries: Dict[str, None] = {}
+    add = queries.setdefault
     if mode == "Event search":
         events = [e.strip() for e in event_keywords.splitlines() if e.strip()]
         companies = [c.strip() for c in companies_filter.splitlines() if c.strip()]
         for e in events:
             # general queries
-            queries.append(f'site:linkedin.com/posts "{e}"')
-            queries.append(f'site:linkedin.com/feed/update "{e}"')
-            # if company slugs available, add strict company queries
-            if company_slugs_for_queries:
-                for slug in company_slugs_for_queries:
-                    queries.append(f'site:linkedin.com/company/{slug} "{e}"')
-                    queries.append(f'site:linkedin.com/posts "linkedin.com/company/{slug}" "{e}"')
-            for c in companies:
-                queries.append(f'site:linkedin.com/posts "{e}" "{c}"')
-                queries.append(f'site:linkedin.com/feed/update "{e}" "{c}"')
+            add(f'site:linkedin.com/posts "{e}"')
+            add(f'site:linkedin.com/feed/update "{e}"')
+        # if company slugs available, add strict company queries
+        for e, slug in itertools.product(events, slugs):
+            add(f'site:linkedin.com/company/{slug} "{e}"')
+            add(f'site:linkedin.com/posts "linkedin.com/company/{slug}" "{e}"')
+        for e, c in itertools.product(events, companies):
+            add(f'site:linkedin.com/posts "{e}" "{c}"')
+            add(f'site:linkedin.com/feed/update "{e}" "{c}"')
 
     elif mode == "Company search":
         companies = [c.strip() for c in companies_input.splitlines() if c.strip()]
         events = [e.strip() for e in event_filter.splitlines() if e.strip()]
+        # prefer company-page queries when we have slugs
+        for c, slug in itertools.product(companies, slugs):
+            add(f'site:linkedin.com/company/{slug}')
+            add(f'site:linkedin.com/company/{slug} "{c}"')
+        # fallback
         for c in companies:
-            # prefer company-page queries when we have slugs
-            if company_slugs_for_queries:
-                for slug in company_slugs_for_queries:
-                    queries.append(f'site:linkedin.com/company/{slug}')
-                    queries.append(f'site:linkedin.com/company/{slug} "{c}"')
-            # fallback
-            queries.append(f'site:linkedin.com/posts "{c}"')
-            queries.append(f'site:linkedin.com/feed/update "{c}"')
-            for e in events:
-                if company_slugs_for_queries:
-                    for slug in company_slugs_for_queries:
-                        queries.append(f'site:linkedin.com/company/{slug} "{e}"')
-                        queries.append(f'site:linkedin.com/posts "linkedin.com/company/{slug}" "{e}"')
-                queries.append(f'site:linkedin.com/posts "{e}" "{c}"')
-                queries.append(f'site:linkedin.com/feed/update "{e}" "{c}"')
-
-    return list(dict.fromkeys(queries))
-
-def within_date_range(parsed_obj, start_date_obj, end_date_obj):
-    dp = parsed_obj.get("date_published")
-    if not dp:
-        return True
-    try:
-        dt = datetime.fromisoformat(dp.replace("Z", "+00:00"))
-        d = dt.date()
-        if start_date_obj and d < start_date_obj:
-            return False
-        if end_date_obj and d > end_date_obj:
-            return False
-        return True
-    except Exception:
-        return True
+            add(f'site:linkedin.com/posts "{c}"')
+            add(f'site:linkedin.com/feed/update "{c}"')
+        # slug+event queries do not depend on the company, so build them once rather than per company
+        if companies:
+            for e, slug in itertools.product(events, slugs):
+                add(f'site:linkedin.com/company/{slug} "{e}"')
+                add(f'site:linkedin.com/posts "linkedin.com/company/{slug}" "{e}"')
+        for c, e in itertools.product(companies, events):
+            add(f'site:linkedin.com/posts "{e}" "{c}"')
+            add(f'site:linkedin.com/feed/update "{e}" "{c}"')
+
+    return list(queries)
 
 if run:
     serp_key = serp_key_input.strip() or os.getenv("SERPAPI_KEY")
     sb_key = sb_key_input.strip() or os.getenv("SCRAPINGBEE_KEY")
 
+    if skip_cache:
+        # bypass the in-process st.cache_data layer as well as Redis
+        serpapi_search.clear()
+        serpapi_find_company_slugs.clear()
+
     candidate_urls: Set[str] = set()
     if mode in ("Event search", "Company search"):
         # --- Resolve company names & slugs for stricter/company-only queries ---
@@ -326,7 +682,7 @@ if run:
                 if any(cn.lower() in s.lower() for s in resolved_slugs):
                     continue
                 try:
-                    found = serpapi_find_company_slugs(cn, serpapi_key=serp_key, top=6)
+                    found = serpapi_find_company_slugs(cn, _serpapi_key=serp_key, top=6, use_cache=not skip_cache)
                 except Exception:
                     found = []
                 for s in found:
@@ -353,16 +709,16 @@ if run:
             st.info(f"Built {len(queries)} queries. Running SerpAPI (top {top_n} per query)...")
             progress = st.progress(0)
             total = len(queries)
-            for i, q in enumerate(queries):
-                try:
-                    urls = serpapi_search(q, top=top_n, serpapi_key=serp_key)
-                    for u in urls:
-                        if "linkedin.com" in u:
-                            candidate_urls.add(u)
-                except Exception as e:
-                    st.warning(f"Search failed for query: {q} — {e}")
-                time.sleep(0.5)
-                progress.progress(int((i+1)/total * 100))
+            # queries are independent I/O: run them on a small pool, paced by _SERP_LIMITER
+            with ThreadPoolExecutor(max_workers=min(SERPAPI_WORKERS, total)) as ex:
+                futures = {ex.submit(serpapi_search, q, top_n, serp_key, not skip_cache): q for q in queries}
+                for i, fut in enumerate(as_completed(futures)):
+                    try:
+                        urls = fut.result()
+                        candidate_urls.update(u for u in urls if "linkedin.com" in u)
+                    except Exception as e:
+                        st.warning(f"Search failed for query: {futures[fut]} — {e}")
+                    progress.progress(int((i+1)/total * 100))
             st.success(f"Discovered {len(candidate_urls)} candidate LinkedIn URLs.")
     else:
         urls = [u.strip() for u in urls_input.splitlines() if u.strip()]
@@ -372,10 +728,7 @@ if run:
     if not candidate_urls:
         st.warning("No LinkedIn URLs found — nothing to fetch.")
     else:
-        st.info(f"Fetching and parsing {len(candidate_urls)} pages (this may take a while).")
         parsed_results = []
-        pbar = st.progress(0)
-        total_count = len(candidate_urls)
         # ensure company names/slugs are available for per-post filtering too
         company_names = [c.strip() for c in company_input.split(",") if c.strip()]
         company_slugs = [s.strip() for s in slug_input.split(",") if s.strip()]
@@ -386,12 +739,72 @@ if run:
         except NameError:
             # resolved_slugs not defined (shouldn't happen), ignore
             pass
-
-        for idx, url in enumerate(sorted(candidate_urls)):
+        # compile names/slugs once for the whole run instead of per post
+        matcher = CompanyMatcher(company_names, company_slugs)
+
+        urls_list = list(candidate_urls)  # order is irrelevant; fetches complete out of order anyway
+        # URL-level prefilter: in company-only mode, drop URLs that cannot be the company's
+        # before paying for a ScrapingBee fetch
+        if only_company and company_names and matcher.slugs:
+            kept = [u for u in urls_list if url_may_match_company(u, matcher)]
+            if len(kept) < len(urls_list):
+                st.info(f"Skipped {len(urls_list) - len(kept)} URL(s) that do not reference the company slug/name.")
+            urls_list = kept
+
+        seen_urls = load_seen_urls()
+        if skip_seen:
+            unseen = [u for u in urls_list if u not in seen_urls]
+            if len(unseen) < len(urls_list):
+                st.info(f"Skipped {len(urls_list) - len(unseen)} URL(s) already fetched in previous runs.")
+            urls_list = unseen
+
+        st.info(f"Fetching and parsing {len(urls_list)} pages (this may take a while).")
+        # one status line + a progress bar that are overwritten in place; per-URL messages go
+        # to run_log and are rendered once at the end instead of one st.write per URL
+        status = st.empty()
+        pbar = st.progress(0)
+        run_log: List[str] = []
+        n_failed = 0
+        fetched = []
+        if not sb_key:
+            st.error("No ScrapingBee key found. Set SCRAPINGBEE_KEY env var or provide key in app.")
+        else:
+            last_pct = 0
+            def _on_fetched(done, total):
+                global last_pct  # the Streamlit script body runs at module scope
+                pct = int(done / total * 100)
+                status.write(f"[{done}/{total}] pages fetched")
+                # throttle progress-bar redraws to ~5% steps
+                if pct - last_pct >= 5 or done == total:
+                    pbar.progress(pct)
+                    last_pct = pct
+            fetched = asyncio.run(gather_all(urls_list, concurrency=int(concurrency), scrapingbee_key=sb_key,
+                                             render_js=render_js, rate=max_fetch_rate or None, on_done=_on_fetched,
+                                             use_cache=not skip_cache))
+
+        # parse the fetched pages (in parallel), then filter synchronously
+        ok_pages = []
+        for url, html, err in fetched:
+            if err is not None:
+                run_log.append(f"Failed to fetch {url}: {err}")
+                n_failed += 1
+            else:
+                ok_pages.append((url, html))
+                seen_urls.add(url)
+        if ok_pages:
+            try:
+                save_seen_urls(seen_urls)
+            except Exception as e:
+                run_log.append(f"Could not save seen-URL filter: {e}")
+        status.write(f"Parsing {len(ok_pages)} pages...")
+        parsed_pages = parse_many([html for _, html in ok_pages], use_cache=not skip_cache)
+
+        for (url, _), parsed in zip(ok_pages, parsed_pages):
+            if isinstance(parsed, Exception):
+                run_log.append(f"Failed to parse {url}: {parsed}")
+                n_failed += 1
+                continue
             try:
-                st.write(f"Fetching: {url}")
-                html = local_fetch_html(url, scrapingbee_key=sb_key, render_js=render_js, save_path=None, timeout=60)
-                parsed = local_parse_html(html, source_filename=None)
                 if not parsed.get("url"):
                     parsed["url"] = url
                 parsed["fetched_url"] = url
@@ -403,32 +816,50 @@ if run:
 
                 # company-only filter if enabled
                 if only_company and company_names:
-                    if not company_matches_parsed(parsed, company_names, company_slugs):
-                        st.write(f"Skipping (not company-author): {url}")
-                        time.sleep(delay_between_fetch)
-                        pbar.progress(int((idx+1)/total_count * 100))
+                    if not company_matches_parsed(parsed, company_names, company_slugs, matcher=matcher):
+                        run_log.append(f"Skipping (not company-author): {url}")
                         continue
 
-                # date filter
-                if not within_date_range(parsed, start_date, end_date):
-                    st.write(f"Skipping (out of date range): {url}")
-                    time.sleep(delay_between_fetch)
-                    pbar.progress(int((idx+1)/total_count * 100))
-                    continue
-
                 parsed_results.append(parsed)
-                st.write("Parsed:", parsed.get("title") or (parsed.get("content") or "")[:120])
+                run_log.append(f"Parsed: {parsed.get('title') or (parsed.get('content') or '')[:120]}")
             except Exception as e:
-                st.error(f"Failed to fetch/parse {url}: {e}")
-            time.sleep(delay_between_fetch)
-            pbar.progress(int((idx+1)/total_count * 100))
+                run_log.append(f"Failed to parse {url}: {e}")
+                n_failed += 1
+
+        status.write(f"Parsed {len(parsed_results)} of {len(urls_list)} pages.")
+        if n_failed:
+            st.warning(f"{n_failed} page(s) failed to fetch/parse — see the run log.")
+        if run_log:
+            with st.expander("Run log"):
+                st.text("\n".join(run_log))
+
+        # date filter: parse the whole column once (vectorized) instead of per post; undated posts are kept
+        df = None
+        if parsed_results:
+            df = pd.DataFrame(parsed_results)
+            raw_dp = df.get("date_published", pd.Series(None, index=df.index, dtype=object))
+            dp = pd.to_datetime(raw_dp, utc=True, errors="coerce", format="ISO8601")
+            # compare on the post's own calendar date, not the UTC-shifted one
+            day = pd.to_datetime(raw_dp.astype("string").str.slice(0, 10), errors="coerce", format="%Y-%m-%d")
+            undated = dp.isna() | day.isna()
+            mask = pd.Series(True, index=df.index)
+            if start_date is not None:
+                mask &= (day >= pd.Timestamp(start_date)) | undated
+            if end_date is not None:
+                mask &= (day <= pd.Timestamp(end_date)) | undated
+            if not mask.all():
+                st.write(f"Skipped {int((~mask).sum())} post(s) out of date range.")
+                parsed_results = [p for p, keep in zip(parsed_results, mask) if keep]
+                df = df[mask].reset_index(drop=True)
+                dp = dp[mask].reset_index(drop=True)
+            # Excel cannot handle timezone-aware datetimes → convert to naive (UTC) datetime
+            df["date_published"] = dp.dt.tz_localize(None)
 
         # Display results and KPIs
         if parsed_results:
-            df = pd.DataFrame(parsed_results)
             # normalize lists
             if "images" in df.columns:
-                df["images"] = df["images"].apply(lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v)
+                df["images"] = df["images"].map(lambda v: orjson.dumps(v).decode("utf-8") if isinstance(v, (list, dict)) else v)
             # ensure numeric types
             for col in ("likes", "comments", "reposts"):
                 if col in df.columns:
@@ -437,21 +868,6 @@ if run:
                     df[col] = 0
             df["engagement"] = df["likes"] + df["comments"] + df["reposts"]
 
-           
-        
-            # date parsing
-        try:
-            df["date_published"] = pd.to_datetime(df["date_published"], utc=True)
-        except Exception:
-            pass
-
-        # Excel cannot handle timezone-aware datetimes → convert to naive datetime
-        if "date_published" in df.columns:
-            try:
-               df["date_published"] = df["date_published"].dt.tz_localize(None)
-            except:
-                pass
-
             # KPIs at top
             col1, col2, col3, col4 = st.columns(4)
             col1.metric("Total Posts", len(df))
@@ -468,56 +884,26 @@ if run:
             results_placeholder.dataframe(df[["url", "title", "author", "date_published", "likes", "comments", "reposts", "engagement"]], use_container_width=True)
 
             # Save outputs
+            # serialize once; the same bytes feed the file and the download button
+            json_bytes = orjson.dumps(parsed_results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
             combined_json_path = combined_json_name
-            with open(combined_json_path, "w", encoding="utf-8") as f:
-                json.dump(parsed_results, f, ensure_ascii=False, indent=4)
+            with open(combined_json_path, "wb") as f:
+                f.write(json_bytes)
             st.success(f"Combined JSON saved to {combined_json_path}")
 
             try:
-                if os.path.exists(master_excel_name):
-                    master_df = pd.read_excel(master_excel_name, engine="openpyxl")
-                else:
-                    master_df = pd.DataFrame()
-                for parsed in parsed_results:
-                    url_val = parsed.get("url")
-                    row = {
-                        "url": url_val,
-                        "title": parsed.get("title"),
-                        "author": parsed.get("author"),
-                        "content": parsed.get("content"),
-                        "likes": parsed.get("likes"),
-                        "comments": parsed.get("comments"),
-                        "reposts": parsed.get("reposts"),
-                        "date_published": parsed.get("date_published"),
-                        "images": json.dumps(parsed.get("images", []), ensure_ascii=False),
-                        "fetched_url": parsed.get("fetched_url")
-                    }
-                    if master_df is None or master_df.empty:
-                        master_df = pd.DataFrame([row])
-                    else:
-                        exist = master_df.index[master_df["url"] == url_val].tolist()
-                        if exist:
-                            idx0 = exist[0]
-                            for k, v in row.items():
-                                master_df.at[idx0, k] = v
-                        else:
-                            master_df = pd.concat([master_df, pd.DataFrame([row])], ignore_index=True)
-                master_df.to_excel(master_excel_name, index=False, engine="openpyxl")
-                st.success(f"Master Excel updated: {master_excel_name}")
+                n_rows = upsert_master_db(master_db_name, parsed_results)
+                st.success(f"Master database updated ({n_rows} rows upserted): {master_db_name}")
             except Exception as e:
-                st.error(f"Failed to update master excel: {e}")
+                st.error(f"Failed to update master database: {e}")
 
             # Download buttons
-            json_bytes = json.dumps(parsed_results, ensure_ascii=False, indent=4).encode("utf-8")
             st.download_button("Download combined JSON", data=json_bytes, file_name=combined_json_name, mime="application/json")
 
             try:
-                import io
-                tosave = io.BytesIO()
                 # Save the current df view to excel for download
                 df_to_save = df[["url", "title", "author", "date_published", "likes", "comments", "reposts", "engagement"]]
-                df_to_save.to_excel(tosave, index=False, engine="openpyxl")
-                tosave.seek(0)
+                tosave = to_excel_bytes(df_to_save)
                 st.download_button("Download results as Excel", data=tosave, file_name="linkedin_results.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             except Exception as e:
                 st.warning("Excel download not available: " + str(e))
@@ -1,11 +1,22 @@
 # parse_linkedin_post.py
-from bs4 import BeautifulSoup
+import orjson
+from selectolax.lexbor import LexborHTMLParser
 import json
 import re
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+_SHORT_NUM_RE = re.compile(r"^([\d.]+)([KkMm]?)$")
+_DIGITS_RE = re.compile(r"(\d[\d,]*)")
+_LIKES_RE = re.compile(r"([\d,.]+(?:[KMkm]?))\s+likes?\b")
+_COMMENTS_RE = re.compile(r"([\d,.]+(?:[KMkm]?))\s+comments?\b")
+_JSON_DECODER = json.JSONDecoder()
+_POSTING_TYPES = frozenset({"SocialMediaPosting", "VideoObject"})
+_ELEMENTS_CSS = 'script[type="application/ld+json"], meta, link[rel~="canonical"], img[src], title'
 
 def parse_short_number(s: Union[str, int, None]) -> Optional[int]:
+    if type(s) is int:
+        return s
     if s is None:
         return None
     if isinstance(s, (int, float)):
@@ -13,7 +24,10 @@ def parse_short_number(s: Union[str, int, None]) -> Optional[int]:
     s = str(s).strip().replace(",", "").replace("\u00A0", "")
     if s == "":
         return None
-    m = re.match(r"^([\d.]+)([KkMm]?)$", s)
+    # plain counts ("1234") skip the regexes
+    if s.isascii() and s.isdigit():
+        return int(s)
+    m = _SHORT_NUM_RE.match(s)
     if m:
         num = float(m.group(1))
         suf = m.group(2).upper()
@@ -22,42 +36,79 @@ def parse_short_number(s: Union[str, int, None]) -> Optional[int]:
         if suf == "M":
             return int(num * 1_000_000)
         return int(num)
-    m2 = re.search(r"(\d[\d,]*)", s)
+    m2 = _DIGITS_RE.search(s)
     if m2:
         return int(m2.group(1).replace(",", ""))
     return None
 
-def _extract_jsonld(soup: BeautifulSoup) -> List[Dict[str, Any]]:
+def _collect_elements(tree: LexborHTMLParser) -> Tuple[List[str], Dict[Tuple[str, str], str], Optional[str], Optional[str], List[str]]:
+    # one selector list = one walk of the tree; matches come back in document order
+    jsonld_texts: List[str] = []
+    meta: Dict[Tuple[str, str], str] = {}
+    canonical = title = None
+    img_srcs: List[str] = []
+    for el in tree.css(_ELEMENTS_CSS):
+        tag = el.tag
+        attrs = el.attributes
+        if tag == "meta":
+            content = attrs.get("content")
+            for attr in ("property", "name"):
+                key = attrs.get(attr)
+                if key is not None:
+                    meta.setdefault((attr, key), content)
+        elif tag == "img":
+            img_srcs.append(attrs.get("src"))
+        elif tag == "script":
+            jsonld_texts.append(el.text(deep=True) or "")
+        elif tag == "link":
+            if canonical is None:
+                canonical = attrs.get("href") or ""
+        elif tag == "title":
+            if title is None:
+                title = el.text()
+    return jsonld_texts, meta, canonical, title, img_srcs
+
+def _extract_jsonld(texts: List[str]) -> List[Dict[str, Any]]:
     results = []
-    for script in soup.find_all("script", {"type": "application/ld+json"}):
-        txt = script.string or script.get_text() or ""
+    for txt in texts:
         txt = txt.strip()
         if not txt:
             continue
         try:
-            parsed = json.loads(txt)
+            parsed = orjson.loads(txt)
             if isinstance(parsed, list):
                 results.extend(parsed)
             else:
                 results.append(parsed)
         except Exception:
-            parts = re.split(r"\}\s*\{", txt)
-            if len(parts) > 1:
-                for i, p in enumerate(parts):
-                    if i == 0:
-                        candidate = p + "}"
-                    elif i == len(parts) - 1:
-                        candidate = "{" + p
-                    else:
-                        candidate = "{" + p + "}"
-                    try:
-                        results.append(json.loads(candidate))
-                    except Exception:
-                        continue
+            # concatenated objects (or input orjson rejects): stdlib raw_decode one at a time
+            i, n = 0, len(txt)
+            while i < n:
+                while i < n and txt[i].isspace():
+                    i += 1
+                if i >= n:
+                    break
+                try:
+                    obj, i = _JSON_DECODER.raw_decode(txt, i)
+                except json.JSONDecodeError:
+                    break
+                results.append(obj)
     return results
 
-def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
+def _is_posting_type(typ: Any) -> bool:
+    # "SocialMediaPosting" or IRI form "http://schema.org/SocialMediaPosting"; non-string entries are ignored
+    for t in typ if isinstance(typ, list) else (typ,):
+        if isinstance(t, str) and t.rsplit("/", 1)[-1] in _POSTING_TYPES:
+            return True
+    return False
+
+def _find_meta(meta: Dict[Tuple[str, str], str], name: str, prop: str = "property") -> Optional[str]:
+    # first <meta {prop}=name>, then first <meta name=name>, as long as content is non-empty
+    return meta.get((prop, name)) or meta.get(("name", name)) or None
+
+def parse_linkedin_html(html: Union[str, bytes], source_filename: Optional[str] = None) -> Dict[str, Any]:
+    # selectolax/lexbor: C parser with CSS selector dispatch, much faster than BeautifulSoup
+    tree = LexborHTMLParser(html)
     out = {
         "url": None,
         "title": None,
@@ -72,8 +123,10 @@ def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dic
         "raw_jsonld": [],
         "source_file": source_filename
     }
+    seen_images = set()  # mirrors out["images"] for O(1) membership checks
 
-    jsonlds = _extract_jsonld(soup)
+    jsonld_texts, meta, canonical, title, img_srcs = _collect_elements(tree)
+    jsonlds = _extract_jsonld(jsonld_texts)
     out["raw_jsonld"] = jsonlds
 
     posting = None
@@ -81,9 +134,7 @@ def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dic
         if not isinstance(obj, dict):
             continue
         typ = obj.get("@type") or obj.get("type") or ""
-        if isinstance(typ, list):
-            typ = " ".join(typ)
-        if "SocialMediaPosting" in str(typ) or "VideoObject" in str(typ) or "SocialMediaPosting" == typ:
+        if _is_posting_type(typ):
             posting = obj
             break
         if "articleBody" in obj or "interactionStatistic" in obj:
@@ -102,18 +153,19 @@ def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dic
             out["author"] = auth
         elif isinstance(auth, list) and auth:
             a0 = auth[0]
-            if isinstance(a0, dict):
-                out["author"] = a0.get("name")
+            out["author"] = a0.get("name") if isinstance(a0, dict) else str(a0)
 
         out["date_published"] = posting.get("datePublished") or posting.get("uploadDate") or out["date_published"]
 
-        for key in ("thumbnailUrl", "image", "thumbnail", "thumbnailUrl", "thumbnailImage", "thumbnailUrl"):
+        for key in ("thumbnailUrl", "image", "thumbnail", "thumbnailImage"):
             v = posting.get(key)
-            if isinstance(v, str) and v not in out["images"]:
+            if isinstance(v, str) and v not in seen_images:
+                seen_images.add(v)
                 out["images"].append(v)
             elif isinstance(v, dict):
                 url = v.get("url")
-                if url and url not in out["images"]:
+                if url and url not in seen_images:
+                    seen_images.add(url)
                     out["images"].append(url)
 
         shared = posting.get("sharedContent")
@@ -122,7 +174,8 @@ def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dic
             si = shared.get("image") or shared.get("thumbnail")
             if isinstance(si, dict):
                 url = si.get("url")
-                if url and url not in out["images"]:
+                if url and url not in seen_images:
+                    seen_images.add(url)
                     out["images"].append(url)
 
         stats = posting.get("interactionStatistic") or posting.get("interactionStatistics")
@@ -141,65 +194,48 @@ def parse_linkedin_html(html: str, source_filename: Optional[str] = None) -> Dic
 
     # meta fallback
     if not out["title"]:
-        og = soup.find("meta", property="og:title")
-        if og and og.get("content"):
-            out["title"] = og["content"]
-        elif soup.title:
-            out["title"] = soup.title.string
+        out["title"] = _find_meta(meta, "og:title") or title
 
     if not out["description"]:
-        ogd = soup.find("meta", property="og:description")
-        if ogd and ogd.get("content"):
-            out["description"] = ogd["content"]
+        out["description"] = _find_meta(meta, "og:description") or _find_meta(meta, "description", prop="name")
 
     if not out["url"]:
-        ogu = soup.find("meta", property="og:url")
-        if ogu and ogu.get("content"):
-            out["url"] = ogu["content"]
-        else:
-            canonical = soup.find("link", rel="canonical")
-            if canonical and canonical.get("href"):
-                out["url"] = canonical["href"]
-
-    og_img = None
-    og_img_tag = soup.find("meta", property="og:image")
-    if og_img_tag and og_img_tag.get("content"):
-        og_img = og_img_tag["content"]
-        if og_img not in out["images"]:
-            out["images"].append(og_img)
-
-    for img in soup.find_all("img", src=True):
-        src = img["src"]
-        if src and len(src) > 20 and src not in out["images"]:
+        out["url"] = _find_meta(meta, "og:url") or canonical or None
+
+    og_img = _find_meta(meta, "og:image")
+    if og_img and og_img not in seen_images:
+        seen_images.add(og_img)
+        out["images"].append(og_img)
+
+    for src in img_srcs:
+        if src and len(src) > 20 and src not in seen_images:
+            seen_images.add(src)
             out["images"].append(src)
 
-    page_text = soup.get_text(" ", strip=True)
-    likes_match = re.search(r"([\d,.]+(?:[KMkm]?))\s+likes?\b", page_text)
-    comments_match = re.search(r"([\d,.]+(?:[KMkm]?))\s+comments?\b", page_text)
-    if likes_match and out["likes"] is None:
-        out["likes"] = parse_short_number(likes_match.group(1))
-    if comments_match and out["comments"] is None:
-        out["comments"] = parse_short_number(comments_match.group(1))
+    # text fallback only when JSON-LD left likes or comments unset
+    if out["likes"] is None or out["comments"] is None:
+        # bs4's get_text skipped script/style/template strings; inline JS must not match "N likes"
+        tree.strip_tags(["script", "style", "template"])
+        page_text = tree.body.text(separator=" ", strip=True) if tree.body else ""
+        if out["likes"] is None:
+            likes_match = _LIKES_RE.search(page_text)
+            if likes_match:
+                out["likes"] = parse_short_number(likes_match.group(1))
+        if out["comments"] is None:
+            comments_match = _COMMENTS_RE.search(page_text)
+            if comments_match:
+                out["comments"] = parse_short_number(comments_match.group(1))
 
     # normalize date
+    # cheap YYYY-MM-DD shape check so non-ISO strings never reach fromisoformat
     dp = out.get("date_published")
-    if dp:
+    if isinstance(dp, str) and len(dp) >= 10 and dp[4] == "-" and dp[7] == "-":
         try:
             if dp.endswith("Z"):
-                dt = datetime.fromisoformat(dp.replace("Z", "+00:00"))
-                out["date_published"] = dt.isoformat()
-            else:
-                dt = datetime.fromisoformat(dp)
-                out["date_published"] = dt.isoformat()
-        except Exception:
-            out["date_published"] = dp
-
-    for k in ("likes", "comments"):
-        if out.get(k) is not None:
-            try:
-                out[k] = int(out[k])
-            except Exception:
-                out[k] = parse_short_number(out[k])
+                dp = dp[:-1] + "+00:00"
+            out["date_published"] = datetime.fromisoformat(dp).isoformat()
+        except ValueError:
+            pass
 
     return out
 
@@ -1,15 +1,30 @@
 # run_pipeline.py
 import os
+import re
 import json
 import time
-from typing import List, Set
-from urllib.parse import quote_plus
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+from urllib.parse import quote_plus, urlsplit
 
 import requests
-import pandas as pd
+import aiohttp
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+try:
+    from tqdm import tqdm
+except Exception:
+    tqdm = None
 
 # local module imports (make sure files are in same directory or install as package)
-from scraper import fetch_html
+from scraper import RateLimiter, fetch_html_async, parse_retry_after
 from parse_linkedin_post import parse_linkedin_html
 
 # ---------------- CONFIG ----------------
@@ -17,23 +32,66 @@ BING_API_KEY = os.getenv("BING_API_KEY")  # set env var or paste your key here (
 TOP_N_PER_KEYWORD = 10
 HTML_TEMP_FOLDER = "html_temp"
 PARSED_JSON_FOLDER = "parsed_jsons"
-MASTER_EXCEL = "linkedin_posts_master.xlsx"
-COMBINED_JSON = "all_posts_combined.json"
+MASTER_PARQUET = "linkedin_posts_master.parquet"
+MASTER_EXCEL = "linkedin_posts_master.xlsx"  # legacy master / --export-xlsx target
+COMBINED_JSONL = "all_posts_combined.jsonl"  # one parsed post per line, written as posts complete
 BING_DELAY_SEC = 1.0
 SCRAPINGBEE_DELAY_SEC = 0.8
+SERP_MAX_ATTEMPTS = 4   # tries per SerpAPI query when it answers 429
+FETCH_CONCURRENCY = 20  # simultaneous ScrapingBee requests
+SNAPSHOT_EVERY = 50     # save the master after this many newly parsed posts
+PARSE_CACHE_DIR = ".parse_cache"  # per-url {html_sha1, parsed_json_path, fetched_at}
+PARSE_CACHE_TTL_SEC = 24 * 3600
+SAFE_BASE_INDEX = os.path.join(PARSED_JSON_FOLDER, "_index.json")  # file stem -> url
+PROFILE_OUT = "pipeline.prof"
 # ---------------------------------------
 
 os.makedirs(HTML_TEMP_FOLDER, exist_ok=True)
 os.makedirs(PARSED_JSON_FOLDER, exist_ok=True)
 
 
+class Timer:
+    """Adds the wall time of a with-block to _STAGE_TIMES[stage]; safe to use from worker threads."""
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._t0
+        with _STAGE_LOCK:
+            _STAGE_TIMES[self.stage] = _STAGE_TIMES.get(self.stage, 0.0) + self.elapsed
+        return False
+
+_STAGE_TIMES: Dict[str, float] = {}
+_STAGE_LOCK = threading.Lock()
+
+def print_stage_times(total: float) -> None:
+    print(f"Stage timings (total {total:.1f}s):")
+    for stage, sec in _STAGE_TIMES.items():
+        print(f"  {stage}: {sec:.1f}s / {100 * sec / total:.0f}%")
+
+_SERP_LIMITER = RateLimiter(rate=1.0 / BING_DELAY_SEC)
+_SB_LIMITER = RateLimiter(rate=1.0 / SCRAPINGBEE_DELAY_SEC)
+
 def serpapi_search(query: str, top: int = 10):
     import requests, os
     key = os.getenv("SERPAPI_KEY") or "paste_your_serpapi_key_here"
     endpoint = "https://serpapi.com/search.json"
     params = {"engine": "google", "q": query, "num": top, "api_key": key}
-    r = requests.get(endpoint, params=params)
-    r.raise_for_status()
+    for attempt in range(1, SERP_MAX_ATTEMPTS + 1):
+        slot = _SERP_LIMITER.acquire()
+        r = requests.get(endpoint, params=params)
+        if r.status_code == 429 and attempt < SERP_MAX_ATTEMPTS:
+            # over SerpAPI's rate: slow the shared limiter (and respect Retry-After) before retrying
+            _SERP_LIMITER.backoff(parse_retry_after(r.headers.get("Retry-After")), slot)
+            continue
+        _SERP_LIMITER.record_attempts(attempt)
+        r.raise_for_status()
+        _SERP_LIMITER.success()
+        break
     data = r.json()
     urls = []
     for item in data.get("organic_results", []):
@@ -42,30 +100,44 @@ def serpapi_search(query: str, top: int = 10):
             urls.append(url)
     return urls
 
+# pure string helpers; the same url comes back from several keywords
+@lru_cache(maxsize=65536)
+def canonicalize(url: str) -> str:
+    # drop query/fragment (tracking params) and trailing slash so one post maps to one url
+    return urlsplit(url)._replace(query="", fragment="").geturl().rstrip("/")
+
+# one scan per url instead of a substring pass per pattern
+_LI_RE = re.compile(r"linkedin\.com.*(?:/posts/|/feed/update/|/activity[:/])")
+
+@lru_cache(maxsize=65536)
 def is_linkedin_post_url(url: str) -> bool:
-    if "linkedin.com" not in url:
-        return False
-    patterns = ["/posts/", "/feed/update/", "/activity:", "/activity/"]
-    return any(p in url for p in patterns)
+    return bool(_LI_RE.search(url))
 
 def save_json(parsed: dict, folder: str, filename_base: str):
     os.makedirs(folder, exist_ok=True)
     fname = f"{filename_base}.json"
     path = os.path.join(folder, fname)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(parsed, f, ensure_ascii=False, indent=4)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(parsed, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     return path
 
-def load_master_df(path: str):
+def load_master_table(path: str) -> Optional[pa.Table]:
     if os.path.exists(path):
         try:
-            return pd.read_excel(path, engine="openpyxl")
+            return pq.read_table(path)
         except Exception:
-            return pd.DataFrame()
-    return pd.DataFrame()
+            return None
+    # first run after the switch to parquet: pick up the old excel master
+    if os.path.exists(MASTER_EXCEL):
+        try:
+            import pandas as pd  # only needed for the one-off xlsx migration
+            return pa.Table.from_pandas(pd.read_excel(MASTER_EXCEL, engine="openpyxl"), preserve_index=False)
+        except Exception:
+            return None
+    return None
 
-def upsert_master(df: pd.DataFrame, parsed: dict) -> pd.DataFrame:
-    row = {
+def _row_from_parsed(parsed: dict) -> dict:
+    return {
         "url": parsed.get("url"),
         "title": parsed.get("title"),
         "author": parsed.get("author"),
@@ -78,80 +150,224 @@ def upsert_master(df: pd.DataFrame, parsed: dict) -> pd.DataFrame:
         "description": parsed.get("description"),
         "source_file": parsed.get("source_file")
     }
-    if df is None or df.empty:
-        return pd.DataFrame([row])
-    if "url" in df.columns:
-        idxs = df.index[df["url"] == row["url"]].tolist()
-        if idxs:
-            idx = idxs[0]
-            for k, v in row.items():
-                df.at[idx, k] = v
-            return df
-    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    return df
-
-def run_keywords(keywords: List[str], top_n_per_keyword: int = TOP_N_PER_KEYWORD):
-    all_urls: Set[str] = set()
-    # 1) discover urls via bing
-    for kw in keywords:
-        q = f'site:linkedin.com/posts "{kw}"'
-        try:
-            urls = serpapi_search(q, top=top_n_per_keyword)
 
-        except Exception as e:
-            print("Bing search error:", e)
-            urls = []
-        time.sleep(BING_DELAY_SEC)
-        if len(urls) < top_n_per_keyword:
-            q2 = f'site:linkedin.com/feed/update "{kw}"'
-            try:
-                more = bing_search(q2, top=(top_n_per_keyword - len(urls)))
-                urls += more
-            except Exception:
-                pass
-            time.sleep(BING_DELAY_SEC)
-        for u in urls:
-            if is_linkedin_post_url(u):
-                all_urls.add(u)
+def upsert_master(master: Optional[pa.Table], rows: List[dict]) -> Optional[pa.Table]:
+    # join-style upsert: drop master rows whose url is being replaced, then append the new rows
+    if not rows:
+        return master
+    new_tbl = pa.Table.from_pylist(list({r["url"]: r for r in rows}.values()))
+    if master is None or master.num_rows == 0 or "url" not in master.column_names:
+        return new_tbl
+    replaced = pc.is_in(master.column("url"), value_set=new_tbl.column("url"))
+    # columns only the master has (e.g. raw_jsonld_present from the batch script) keep their old values
+    extra = [c for c in master.column_names if c not in new_tbl.column_names]
+    if extra:
+        # left join on url: position of each new url in the master, null where the url is new
+        pos = pc.index_in(new_tbl.column("url"), value_set=master.column("url"))
+        for c in extra:
+            new_tbl = new_tbl.append_column(master.schema.field(c), master.column(c).take(pos))
+    kept = master.filter(pc.invert(replaced))
+    return pa.concat_tables([kept, new_tbl], promote_options="permissive")
 
-    print(f"Found {len(all_urls)} LinkedIn candidate URLs from keywords: {keywords}")
+def _snapshot(master: pa.Table) -> None:
+    # write-then-rename: a crash mid-write never leaves a truncated master behind
+    with Timer("save master"):
+        tmp = MASTER_PARQUET + ".tmp"
+        pq.write_table(master, tmp, compression="zstd")
+        os.replace(tmp, MASTER_PARQUET)
+
+def _write_html(path: str, html: bytes) -> None:
+    try:
+        with open(path, "wb") as f:
+            f.write(html)
+    except Exception as e:
+        print("HTML save failed:", e)
 
-    master_df = load_master_df(MASTER_EXCEL)
-    processed = []
-    for url in sorted(all_urls):
+def _safe_base(url: str) -> str:
+    # fixed-length file stem: long urls can't exceed filename limits and never collide on "/" vs "_"
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+
+def _update_safe_base_index(urls: List[str]) -> None:
+    # sidecar {file stem: url} so html_temp/ and parsed_jsons/ files can still be traced back
+    index = {}
+    try:
+        with open(SAFE_BASE_INDEX, "rb") as f:
+            index = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        pass
+    index.update((_safe_base(u), u) for u in urls)
+    with open(SAFE_BASE_INDEX, "wb") as f:
+        f.write(orjson.dumps(index, option=orjson.OPT_INDENT_2))
+
+def _meta_path(url: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".meta.json")
+
+def _load_meta(url: str) -> Optional[dict]:
+    try:
+        with open(_meta_path(url), "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _save_meta(url: str, html_sha1: str, parsed_json_path: str) -> None:
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    meta = {"html_sha1": html_sha1, "parsed_json_path": parsed_json_path, "fetched_at": time.time()}
+    with open(_meta_path(url), "wb") as f:
+        f.write(orjson.dumps(meta))
+
+def _load_parsed(meta: Optional[dict]) -> Optional[dict]:
+    if not meta:
+        return None
+    try:
+        with open(meta["parsed_json_path"], "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, KeyError, orjson.JSONDecodeError):
+        return None
+
+def _parse_and_save(html: bytes, html_sha1: str, url: str, html_writer: Optional[ThreadPoolExecutor] = None,
+                    meta: Optional[dict] = None) -> dict:
+    # sync part of the per-url work; runs in the default executor so it overlaps network waits
+    safe_base = _safe_base(url)
+    html_save = os.path.join(HTML_TEMP_FOLDER, f"{safe_base}.html")
+    if html_writer is not None:
+        # keeping the raw page is optional and off the hot path; the parser uses the in-memory html
+        html_writer.submit(_write_html, html_save, html)
+
+    # same page as last time: reuse the parsed json instead of parsing again
+    if meta and meta.get("html_sha1") == html_sha1:
+        parsed = _load_parsed(meta)
+        if parsed is not None:
+            _save_meta(url, html_sha1, meta["parsed_json_path"])
+            return parsed
+
+    with Timer("parse (summed over threads)"):
+        # source_file only names the html when --keep-html actually wrote it
+        parsed = parse_linkedin_html(html, source_filename=html_save if html_writer is not None else None)
+    # ensure parsed.url is filled (fallback to url)
+    if not parsed.get("url"):
+        parsed["url"] = url
+
+    json_path = save_json(parsed, PARSED_JSON_FOLDER, safe_base)
+    print("Parsed JSON saved:", json_path)
+    _save_meta(url, html_sha1, json_path)
+    return parsed
+
+async def _bounded_fetch(sem: asyncio.Semaphore, session: aiohttp.ClientSession, url: str,
+                         html_writer: Optional[ThreadPoolExecutor] = None, refresh: bool = False):
+    # cache lookups read files; keep them off the event loop like the parse itself
+    meta = await asyncio.to_thread(_load_meta, url)
+    if not refresh and meta and time.time() - meta.get("fetched_at", 0) < PARSE_CACHE_TTL_SEC:
+        # parsed recently: skip both the ScrapingBee call and the parse
+        parsed = await asyncio.to_thread(_load_parsed, meta)
+        if parsed is not None:
+            return parsed
+    async with sem:
         try:
             print("Fetching:", url)
-            html = fetch_html(url, render_js=True, save_path=None)  # you can save html by setting save_path
-            time.sleep(SCRAPINGBEE_DELAY_SEC)
+            # --refresh bypasses the html cache too, otherwise it would replay the old page
+            html = await fetch_html_async(session, url, render_js=True, save_path=None,  # you can save html by setting save_path
+                                          use_cache=not refresh, limiter=_SB_LIMITER)
         except Exception as e:
             print("Fetch failed:", e)
-            continue
+            return None
+    # encode once here: the hash, the parser (lexbor reads bytes) and the html writer all use the bytes,
+    # and rebinding drops the str so only one copy of the page is alive while it is parsed
+    html = html.encode("utf-8")
+    html_sha1 = hashlib.sha1(html).hexdigest()
+    loop = asyncio.get_running_loop()
+    # on --refresh always re-parse, even if the page hash is unchanged
+    return await loop.run_in_executor(None, _parse_and_save, html, html_sha1, url, html_writer,
+                                      None if refresh else meta)
 
-        safe_base = url.replace("https://", "").replace("http://", "").replace("/", "_")
-        html_save = os.path.join(HTML_TEMP_FOLDER, f"{safe_base}.html")
-        with open(html_save, "w", encoding="utf-8") as f:
-            f.write(html)
+def _discover_one(kw: str, top_n_per_keyword: int) -> Set[str]:
+    q = f'site:linkedin.com/posts "{kw}"'
+    try:
+        urls = serpapi_search(q, top=top_n_per_keyword)
+    except Exception as e:
+        print("Search error:", e)
+        urls = []
+    if len(urls) < top_n_per_keyword:
+        q2 = f'site:linkedin.com/feed/update "{kw}"'
+        try:
+            more = serpapi_search(q2, top=(top_n_per_keyword - len(urls)))
+            urls += more
+        except Exception as e:
+            print("Search error (feed/update):", e)
+    return {canonicalize(u) for u in urls if is_linkedin_post_url(u)}
+
+async def run_keywords(keywords: List[str], top_n_per_keyword: int = TOP_N_PER_KEYWORD, export_xlsx: bool = False,
+                       keep_html: bool = False, refresh: bool = False):
+    all_urls: Set[str] = set()
+    # 1) discover urls, one worker per keyword; the shared limiter paces the SerpAPI calls
+    with Timer("discover"):
+        if keywords:
+            with ThreadPoolExecutor(max_workers=min(16, len(keywords))) as ex:
+                futures = {ex.submit(_discover_one, kw, top_n_per_keyword): kw for kw in keywords}
+                for fut in as_completed(futures):
+                    all_urls |= fut.result()
+
+    print(f"Found {len(all_urls)} LinkedIn candidate URLs from keywords: {keywords}")
+
+    master = load_master_table(MASTER_PARQUET)
+    if not refresh and master is not None and "url" in master.column_names:
+        known = {canonicalize(u) for u in master.column("url").to_pylist() if u}
+        skipped = len(all_urls & known)
+        all_urls -= known
+        if skipped:
+            print(f"Skipping {skipped} URLs already in the master (use --refresh to re-fetch)")
+    urls = sorted(all_urls)
+    # only the master rows are kept in memory; full parsed posts go straight to COMBINED_JSONL
+    rows: List[Optional[dict]] = [None] * len(urls)
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
 
-        parsed = parse_linkedin_html(html, source_filename=html_save)
-        # ensure parsed.url is filled (fallback to url)
-        if not parsed.get("url"):
-            parsed["url"] = url
+    async def _indexed(i: int, u: str):
+        return i, await _bounded_fetch(sem, session, u, html_writer, refresh)
 
-        json_path = save_json(parsed, PARSED_JSON_FOLDER, safe_base)
-        print("Parsed JSON saved:", json_path)
+    with Timer("fetch+parse (wall)"):
+        # leaving the writer's with-block waits for any pending html writes
+        with ThreadPoolExecutor(max_workers=4) as writer, open(COMBINED_JSONL, "wb") as out:
+            html_writer = writer if keep_html else None
+            async with aiohttp.ClientSession() as session:
+                done = 0
+                pbar = tqdm(total=len(urls), desc="posts", unit="url") if tqdm is not None and urls else None
+                for fut in asyncio.as_completed([_indexed(i, u) for i, u in enumerate(urls)]):
+                    if pbar is not None:
+                        pbar.update(1)
+                    try:
+                        i, parsed = await fut
+                    except Exception as e:
+                        print("Parse failed:", e)
+                        continue
+                    if parsed is None:
+                        continue
+                    out.write(orjson.dumps(parsed, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+                    rows[i] = _row_from_parsed(parsed)
+                    done += 1
+                    if done % SNAPSHOT_EVERY == 0:
+                        # periodic snapshot so a killed run keeps what it already fetched
+                        await asyncio.to_thread(_snapshot, upsert_master(master, [r for r in rows if r is not None]))
+                        print(f"Master snapshot saved after {done} posts")
+                if pbar is not None:
+                    pbar.close()
 
-        master_df = upsert_master(master_df, parsed)
-        processed.append(parsed)
+    processed = [r for r in rows if r is not None]
+    _update_safe_base_index([u for u, r in zip(urls, rows) if r is not None])
+    with Timer("upsert"):
+        master = upsert_master(master, processed)
 
     # save outputs
-    if master_df is not None:
-        master_df.to_excel(MASTER_EXCEL, index=False, engine="openpyxl")
-        print("Master Excel updated:", MASTER_EXCEL)
+    if master is not None:
+        _snapshot(master)
+        print("Master Parquet updated:", MASTER_PARQUET)
+        if export_xlsx:
+            master.to_pandas().to_excel(MASTER_EXCEL, index=False, engine="openpyxl")
+            print("Master Excel exported:", MASTER_EXCEL)
 
-    with open(COMBINED_JSON, "w", encoding="utf-8") as f:
-        json.dump(processed, f, ensure_ascii=False, indent=4)
-    print("Combined JSON saved:", COMBINED_JSON)
+    print("Combined JSONL saved:", COMBINED_JSONL)
     print("Done. Processed:", len(processed))
+    # tries needed per request, e.g. {1: 20, 2: 3}; anything past 1 was a 429 retry
+    print("SerpAPI attempts:", dict(sorted(_SERP_LIMITER.attempts.items())))
+    print("ScrapingBee attempts:", dict(sorted(_SB_LIMITER.attempts.items())))
 
 if __name__ == "__main__":
     # example: use CLI or change keywords here
@@ -159,6 +375,23 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Find LinkedIn posts by keywords, fetch and parse them")
     parser.add_argument("--keywords", "-k", nargs="+", required=False, help="Keywords to search (e.g. 'mothers day')", default=["mothers day"])
     parser.add_argument("--top", "-n", type=int, help="Top N results per keyword", default=TOP_N_PER_KEYWORD)
+    parser.add_argument("--keep-html", action=argparse.BooleanOptionalAction, default=False,
+                        help=f"Save fetched pages under {HTML_TEMP_FOLDER}/")
+    parser.add_argument("--refresh", action="store_true", help="Re-fetch URLs that are already in the master")
+    parser.add_argument("--export-xlsx", action="store_true", help=f"Also write the master to {MASTER_EXCEL}")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Print per-stage timings and write cProfile stats to {PROFILE_OUT}")
     args = parser.parse_args()
 
-    run_keywords(args.keywords, top_n_per_keyword=args.top)
+    if args.profile:
+        import cProfile
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        prof.enable()
+    asyncio.run(run_keywords(args.keywords, top_n_per_keyword=args.top, export_xlsx=args.export_xlsx,
+                             keep_html=args.keep_html, refresh=args.refresh))
+    if args.profile:
+        prof.disable()
+        prof.dump_stats(PROFILE_OUT)
+        print_stage_times(time.perf_counter() - t0)
+        print(f"cProfile stats saved: {PROFILE_OUT} (python -m pstats {PROFILE_OUT})")
@@ -1,12 +1,33 @@
 # scrapper.py
 import os
+import time
+import asyncio
+import threading
+import hashlib
 import requests
-from typing import Optional
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
 
 # You can keep your existing API key here, but it's safer to set environment variable SCRAPINGBEE_KEY.
 # If you already have the key hard-coded, you can leave it here. Otherwise set env var SCRAPINGBEE_KEY.
 API_KEY = os.getenv("SCRAPINGBEE_KEY") or "PZIZ4DXE3FEIVXEHECZJ9JN58KY4RSY6E4U9WORNZ8T0RKTDHRYC79P4QZJ40ZKFWVDTBIQ1R0Q0FB80"
 ENDPOINT = "https://app.scrapingbee.com/api/v1/"
+CACHE_DIR = ".fetch_cache"      # fetched HTML keyed by sha256(url + render_js); reruns replay from here
+CACHE_TTL_SEC = 6 * 3600
+MAX_ATTEMPTS = 4                # tries per url when ScrapingBee answers 429
+
+# module-level session keeps the TLS connection to ScrapingBee alive across fetch_html calls
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=50,
+                                       max_retries=Retry(total=3, backoff_factor=0.5,
+                                                         status_forcelist=[429, 502, 503, 504])))
+
+# url cache key -> future of the request currently fetching it (single-flight)
+_inflight: Dict[str, asyncio.Future] = {}
 
 def fetch_html(url: str, render_js: bool = True, save_path: Optional[str] = None, timeout: int = 60) -> str:
     """
@@ -25,14 +46,195 @@ def fetch_html(url: str, render_js: bool = True, save_path: Optional[str] = None
         # you can add other params like premium_proxy, block_ads, etc.
     }
     headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-    r = requests.get(ENDPOINT, params=params, headers=headers, timeout=timeout)
+    r = _SESSION.get(ENDPOINT, params=params, headers=headers, timeout=timeout)
     r.raise_for_status()
     html = r.text
 
     if save_path:
-        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write(html)
+        _save_html(save_path, html)
+
+    return html
+
+def _save_html(save_path: str, html: str) -> None:
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    with open(save_path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+class RateLimiter:
+    """
+    Fixed-spacing limiter (no burst allowance): spaces acquisitions at least 1/rate seconds apart across
+    threads (acquire) and asyncio tasks (acquire_async). A falsy rate disables the spacing.
+    The interval adapts on HTTP 429: backoff() stretches it by 1.5x (and honours Retry-After), at most once
+    per wave of requests -- a 429 for a slot reserved before the last backoff is already accounted for.
+    Every RECOVER_AFTER consecutive success() calls halve the distance back to the base interval.
+    acquire/acquire_async return the reserved slot; pass it to backoff().
+    attempts counts how many tries each request needed, e.g. {1: 20, 2: 3}.
+    """
+    RECOVER_AFTER = 10
+
+    def __init__(self, rate: Optional[float], max_interval: float = 60.0):
+        self._base_interval = self._interval = 1.0 / rate if rate else 0.0
+        self._max_interval = max_interval
+        self._ok_streak = 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+        self._backoff_mark = float("-inf")  # slots reserved before this predate the last backoff
+        self.attempts: Counter = Counter()
+
+    def backoff(self, retry_after: Optional[float] = None, slot: Optional[float] = None):
+        with self._lock:
+            self._ok_streak = 0
+            if slot is None or slot >= self._backoff_mark:
+                self._backoff_mark = self._next
+                self._interval = min(max(self._interval * 1.5, self._base_interval), self._max_interval)
+            if retry_after:
+                self._next = max(self._next, time.monotonic() + retry_after)
+
+    def success(self):
+        with self._lock:
+            self._ok_streak += 1
+            if self._ok_streak >= self.RECOVER_AFTER and self._interval > self._base_interval:
+                self._interval = (self._interval + self._base_interval) / 2
+                if self._interval < self._base_interval * 1.05:
+                    self._interval = self._base_interval
+                self._ok_streak = 0
+
+    def record_attempts(self, n: int):
+        with self._lock:
+            self.attempts[n] += 1
+
+    def _reserve(self) -> Tuple[float, float]:
+        # claim the next slot; return it and how long the caller has to wait for it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        return slot, slot - now
+
+    def acquire(self) -> float:
+        slot, delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+        return slot
+
+    async def acquire_async(self) -> float:
+        slot, delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return slot
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delay-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _cache_path(url: str, render_js: bool) -> str:
+    key = hashlib.sha256(f"{url}|{int(render_js)}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.html")
+
+def _read_cache(path: str) -> Optional[str]:
+    try:
+        if time.time() - os.path.getmtime(path) < CACHE_TTL_SEC:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+def _write_cache(path: str, html: str) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp, path)
+
+async def _fetch_remote(session: aiohttp.ClientSession, url: str, render_js: bool, timeout: int) -> str:
+    params = {
+        "api_key": API_KEY,
+        "url": url,
+        "render_js": "true" if render_js else "false",
+    }
+    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+    async with session.get(ENDPOINT, params=params, headers=headers,
+                           timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+        r.raise_for_status()
+        return await r.text()
+
+async def _fetch_with_backoff(session: aiohttp.ClientSession, url: str, render_js: bool, timeout: int,
+                              limiter: Optional[RateLimiter]) -> str:
+    # 429 means we are over the provider's rate: wait (Retry-After if given), slow the limiter, try again
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if limiter is not None:
+            slot = await limiter.acquire_async()
+        try:
+            html = await _fetch_remote(session, url, render_js, timeout)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 429 or attempt == MAX_ATTEMPTS:
+                if limiter is not None:
+                    limiter.record_attempts(attempt)
+                raise
+            retry_after = parse_retry_after(e.headers.get("Retry-After") if e.headers else None)
+            if limiter is not None:
+                limiter.backoff(retry_after, slot)
+            else:
+                await asyncio.sleep(retry_after if retry_after is not None else 2 ** attempt)
+            continue
+        if limiter is not None:
+            limiter.success()
+            limiter.record_attempts(attempt)
+        return html
+
+async def fetch_html_async(session: aiohttp.ClientSession, url: str, render_js: bool = True,
+                           save_path: Optional[str] = None, timeout: int = 60, use_cache: bool = True,
+                           limiter: Optional[RateLimiter] = None) -> str:
+    """
+    Async version of fetch_html for running many fetches concurrently.
+    - session: shared aiohttp.ClientSession (reuses connections across calls)
+    - use_cache: replay HTML fetched within CACHE_TTL_SEC from CACHE_DIR
+    - limiter: optional RateLimiter acquired before each network request (cache hits are free)
+    Concurrent calls for the same url share one ScrapingBee request.
+    Returns HTML text (string) or raises on error.
+    """
+    if not API_KEY:
+        raise RuntimeError("No ScrapingBee API key found. Set SCRAPINGBEE_KEY env var or add API_KEY in scrapper.py")
+
+    path = _cache_path(url, render_js)
+    # file I/O on multi-MB pages goes to a thread so it doesn't stall the event loop
+    html = await asyncio.to_thread(_read_cache, path) if use_cache else None
+    if html is None:
+        fut = _inflight.get(path)
+        if fut is not None:
+            html = await asyncio.shield(fut)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            _inflight[path] = fut
+            try:
+                html = await _fetch_with_backoff(session, url, render_js, timeout, limiter)
+                try:
+                    await asyncio.to_thread(_write_cache, path, html)
+                except OSError as e:
+                    # the cache is only an optimisation; never lose a paid response over it
+                    print("HTML cache write failed:", e)
+                fut.set_result(html)
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()  # waiters get the error; don't warn if there were none
+                raise
+            finally:
+                if not fut.done():
+                    fut.cancel()
+                _inflight.pop(path, None)
+
+    if save_path:
+        await asyncio.to_thread(_save_html, save_path, html)
 
     return html
 
@@ -0,0 +1,22 @@
+from parse_linkedin_post import parse_linkedin_html
+
+
+def test_text_fallback_ignores_script_and_style():
+    html = '<body><script>var x="5 likes"</script><style>.c:after{content:"9 comments"}</style><p>hello</p></body>'
+    out = parse_linkedin_html(html)
+    assert out["likes"] is None
+    assert out["comments"] is None
+
+
+def test_text_fallback_reads_visible_counts():
+    html = '<body><script>var x="5 likes"</script><span>12 likes</span><span>3 comments</span></body>'
+    out = parse_linkedin_html(html)
+    assert out["likes"] == 12
+    assert out["comments"] == 3
+
+
+def test_posting_type_iri_and_non_string():
+    html = ('<script type="application/ld+json">[{"@type": {"x": 1}, "headline": "skip"},'
+            '{"@type": "http://schema.org/SocialMediaPosting", "headline": "hi"}]</script>')
+    out = parse_linkedin_html(html)
+    assert out["title"] == "hi"